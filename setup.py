@@ -38,7 +38,7 @@ with open('README.md', 'r') as fh:
 setuptools.setup(
     name='terra_billing_alert',
     version=find_meta('version'),
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     scripts=[
         'bin/terra_billing_alert',
     ],
@@ -61,6 +61,9 @@ setuptools.setup(
         'common==0.1.2',
         'slackclient==2.9.4',
         'google-cloud-bigquery',
+        'google-cloud-bigquery-storage',
+        'pyarrow>=7.0.0',
         'ndg-httpsclient',
+        'requests',
     ],
 )
@@ -1,14 +1,43 @@
+import csv
+import io
 import logging
-import pandas as pd
-import pandas_gbq
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta, timezone
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from .datetime_util import (
+    get_utc_cutoff_time,
+    get_utc_now,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+# float values read back from BigQuery are rounded to this precision
+# before being compared as part of a duplicate key
+DUPLICATE_KEY_FLOAT_NDIGITS = 6
+
+
+def get_float_for_duplicate_key(val):
+    '''Round float `val` so that it can be compared/hashed as part of a
+    duplicate key. None and NaN (missing value in BigQuery) map to None.
+    '''
+    if val is None or val != val:
+        return None
+    return round(val, DUPLICATE_KEY_FLOAT_NDIGITS)
+
+
+def update_max_values(max_values, item):
+    '''Update dict `max_values` of {key: max value} with values in `item`.
+    None and NaN are skipped.
+    '''
+    for key, max_value in max_values.items():
+        val = item[key]
+        if val is None or val != val:
+            continue
+        if max_value is None or val > max_value:
+            max_values[key] = val
+
+
 class AlertItemError(Exception):
     pass
 
@@ -27,13 +56,23 @@ class AlertItem(OrderedDict, ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def need_to_alert(self, within_hours):
+    def need_to_alert(self, cutoff_time):
+        '''Args:
+            cutoff_time: datetime object based on UTC timezone.
+                Items older than this are not alerted.
+        '''
         raise NotImplementedError
 
     @abstractmethod
     def is_duplicate(self, alert_item):
         raise NotImplementedError
 
+    @abstractmethod
+    def get_duplicate_key(self):
+        '''Returns a hashable key. Duplicates of an item must have the same key.
+        '''
+        raise NotImplementedError
+
     def is_duplicate_in(self, alert_items):
         '''Check if `self.item`'s duplicate exists in `alert_items`.
         '''
@@ -45,6 +84,10 @@ class AlertItem(OrderedDict, ABC):
 
 
 class AlertItems(ABC):
+    # dict of {key: max value} for get_alert_max_keys().
+    # Set by filter_out_duplicates(). Otherwise computed in send_alert().
+    max_values = None
+
     def __init__(self, items=[]):
         '''Args:
             items: A list of AlertItem.
@@ -70,6 +113,13 @@ class AlertItems(ABC):
     def get_alert_item_table_schema(cls):
         raise NotImplementedError
 
+    @classmethod
+    def get_alert_item_table_partition_key(cls):
+        '''TIMESTAMP column to partition a new Big Query table by DAY.
+        Table is not partitioned if None.
+        '''
+        return None
+
     @classmethod
     @abstractmethod
     def from_terra(cls, namespace, workspace=None):
@@ -97,15 +147,46 @@ class AlertItems(ABC):
         '''Read from Big Query table and filter out old records if within_hours and
         time_key are defined.
         '''
+        # import heavy modules here to reduce Cloud Function's cold start time
+        import pandas as pd
+        import pandas_gbq
+
         project_id, dataset_id, table_id = bigquery_table_id.split('.')
 
+        # select columns in schema only instead of SELECT *
+        columns = ', '.join(
+            col['name'] for col in cls.get_alert_item_table_schema()
+        )
+        configuration = None
+
         try:
             if within_hours and time_key:
-                timestamp = datetime.now(timezone.utc) - timedelta(hours=within_hours)
-                sql = f"SELECT * FROM {dataset_id}.{table_id} WHERE {time_key}>='{timestamp}'"
+                timestamp = get_utc_cutoff_time(within_hours)
+                # use a TIMESTAMP query parameter so that BigQuery can prune
+                # partitions if table is partitioned on time_key
+                sql = f"SELECT {columns} FROM {dataset_id}.{table_id} WHERE {time_key}>=@cutoff"
+                configuration = {
+                    'query': {
+                        'parameterMode': 'NAMED',
+                        'queryParameters': [
+                            {
+                                'name': 'cutoff',
+                                'parameterType': {'type': 'TIMESTAMP'},
+                                'parameterValue': {'value': timestamp.isoformat()},
+                            },
+                        ],
+                    },
+                }
             else:
-                sql = f"SELECT * FROM {dataset_id}.{table_id}"
-            df = pd.read_gbq(sql, project_id=project_id)
+                sql = f"SELECT {columns} FROM {dataset_id}.{table_id}"
+            # BigQuery Storage API downloads results in Arrow format (much faster than REST)
+            df = pd.read_gbq(
+                sql,
+                project_id=project_id,
+                use_bqstorage_api=True,
+                dialect='standard',
+                configuration=configuration,
+            )
 
             # timestamp is still in pandas Timestamp() format
             return cls.from_dataframe(df)
@@ -125,41 +206,162 @@ class AlertItems(ABC):
             return cls(items=[])
 
     def to_dataframe(self):
+        import pandas as pd
+
         return pd.DataFrame(data=self.items)
 
+    def to_arrow(self):
+        '''Returns a pyarrow.Table with explicit schema converted from
+        the item's Big Query table schema.
+        '''
+        import pyarrow as pa
+
+        bigquery_to_arrow_type = {
+            'STRING': pa.string(),
+            'FLOAT': pa.float64(),
+            'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+        }
+        schema = pa.schema([
+            (col['name'], bigquery_to_arrow_type[col['type']])
+            for col in self.__class__.get_alert_item_table_schema()
+        ])
+        return pa.Table.from_pylist(self.items, schema=schema)
+
     def update_bigquery(self, bigquery_table_id, dry_run=False):
+        '''Append items to Big Query table with a load job from an in-memory
+        Parquet file (converted from Arrow table without pandas).
+        Table is created if it does not exist (partitioned on
+        get_alert_item_table_partition_key() if defined).
+        '''
         project_id, dataset_id, table_id = bigquery_table_id.split('.')
 
-        if not dry_run and self.items:
-            return self.to_dataframe().to_gbq(
-                f'{dataset_id}.{table_id}',
-                project_id=project_id,
-                if_exists='append',
-                table_schema=self.__class__.get_alert_item_table_schema(),
-            )
+        if dry_run or not self.items:
+            return
+
+        import google.api_core.exceptions
+        import pyarrow.parquet as pq
+        from google.cloud import bigquery
+
+        buf = io.BytesIO()
+        pq.write_table(self.to_arrow(), buf)
+
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            schema=[
+                bigquery.SchemaField(col['name'], col['type'])
+                for col in self.__class__.get_alert_item_table_schema()
+            ],
+        )
+        client = bigquery.Client(project=project_id)
+
+        partition_key = self.__class__.get_alert_item_table_partition_key()
+        if partition_key:
+            # partitioning can only be specified when creating a new table.
+            # appending to an existing table with a different partitioning fails.
+            try:
+                client.get_table(bigquery_table_id)
+            except google.api_core.exceptions.NotFound:
+                job_config.time_partitioning = bigquery.TimePartitioning(
+                    type_=bigquery.TimePartitioningType.DAY,
+                    field=partition_key,
+                )
+
+        job = client.load_table_from_file(
+            buf, bigquery_table_id, rewind=True, job_config=job_config
+        )
+        return job.result()
 
     def get_items_to_alert(self, within_hours):
         '''Returns a AlertItems object with items to send alerts.
         '''
+        cutoff_time = get_utc_cutoff_time(within_hours)
         items_to_alert = []
         for item in self.items:
-            if item.need_to_alert(within_hours):
+            if item.need_to_alert(cutoff_time):
                 items_to_alert.append(item)
         return type(self)(items_to_alert)
 
+    def get_duplicate_index(self):
+        '''Returns a dict of {duplicate key: list of items with the key}.
+        '''
+        index = defaultdict(list)
+        for item in self.items:
+            index[item.get_duplicate_key()].append(item)
+        return index
+
     def filter_out_duplicates(self, alert_items):
         '''Looks into each item in `items` and filters out duplicates.
+        Items in `alert_items` are indexed by duplicate key so that each item
+        is compared with items with the same key only.
         '''
+        index = alert_items.get_duplicate_index()
         filtered_list = []
+        # max values to be shown in alert message are updated in the same loop
+        max_values = self.__class__.init_max_values()
         for my_item in self.items:
-            if not my_item.is_duplicate_in(alert_items):
+            if not my_item.is_duplicate_in(index.get(my_item.get_duplicate_key())):
                 filtered_list.append(my_item)
-        return type(self)(filtered_list)
+                update_max_values(max_values, my_item)
+
+        filtered = type(self)(filtered_list)
+        filtered.max_values = max_values
+        return filtered
 
     def to_csv(self, sep=','):
-        df = pd.DataFrame(data=self.items)
-        return df.to_csv(sep=sep, index=False)
+        '''Write items to a CSV string without building a DataFrame.
+        None is written as an empty string.
+        '''
+        if not self.items:
+            return ''
+        f = io.StringIO()
+        writer = csv.writer(f, delimiter=sep, lineterminator='\n')
+        writer.writerow(self.items[0].keys())
+        for item in self.items:
+            writer.writerow(item.values())
+        return f.getvalue()
 
+    @classmethod
     @abstractmethod
-    def send_alert(self, alert_sender, sep=',', quote_table='', dry_run=False):
+    def get_alert_max_keys(cls):
+        '''Returns a list of (label, key) tuples.
+        Max value of item[key] among all items is shown as `label=max_value`
+        in alert message.
+        '''
         raise NotImplementedError
+
+    @classmethod
+    def init_max_values(cls):
+        return dict.fromkeys(key for _, key in cls.get_alert_max_keys())
+
+    def send_alert(self, alert_sender, sep=',', quote_table='', dry_run=False):
+        item_type = self.__class__.get_alert_item_type().__name__
+
+        if not self.items:
+            logger.info(f'send_alert: no {item_type.lower()}s found to send alert.')
+            return
+
+        title = f'Terra billing alert ({item_type})'
+
+        max_values = self.max_values
+        if max_values is None:
+            max_values = self.__class__.init_max_values()
+            for item in self.items:
+                update_max_values(max_values, item)
+
+        max_values_str = ', '.join(
+            '{label}={max_value}'.format(
+                label=label,
+                max_value=max_values[key],
+            )
+            for label, key in self.__class__.get_alert_max_keys()
+        )
+        contents = f'{max_values_str}, reported at {get_utc_now()})'
+        table = self.to_csv(sep=sep)
+        if quote_table:
+            table = quote_table + table + quote_table
+        message = '\n'.join([contents, table])
+
+        logger.info(f'send_alert: {title}, {message}')
+        if not dry_run:
+            alert_sender.send_message(title, message)
@@ -1,6 +1,4 @@
 import logging
-from slack import WebClient
-from slack.errors import SlackApiError
 
 
 logger = logging.getLogger(__name__)
@@ -14,11 +12,24 @@ class AlertSender:
 
 class SlackSender(AlertSender):
     def __init__(self, channel, token):
-        self.client = WebClient(token)
+        self._client = None
         self.channel = channel
         self.token = token
 
+    @property
+    def client(self):
+        '''Slack client is created on demand so that slack module is not
+        imported at all if there is nothing to send.
+        '''
+        if self._client is None:
+            from slack import WebClient
+
+            self._client = WebClient(self.token)
+        return self._client
+
     def send_message(self, title, message):
+        from slack.errors import SlackApiError
+
         try:
             self.client.chat_postMessage(
                 channel=self.channel,
@@ -6,7 +6,6 @@ from .alert_item import (
     AlertItems,
 )
 from .datetime_util import (
-    get_past_hours_from_now,
     get_utc_now,
 )
 from .terra_util import (
@@ -50,9 +49,9 @@ class Bucket(AlertItem):
             alert_time=d['alert_time']
         )
 
-    def need_to_alert(self, within_hours):
+    def need_to_alert(self, cutoff_time):
         size_is_bigger = self['size_tb'] >= Bucket.LIMIT_SIZE_TB
-        time_is_within_hours = get_past_hours_from_now(self['alert_time']) < within_hours
+        time_is_within_hours = self['alert_time'] > cutoff_time
 
         if size_is_bigger and time_is_within_hours:
             return True
@@ -66,6 +65,12 @@ class Bucket(AlertItem):
 
         return same_namespace and same_workspace and same_or_smaller_size_tb
 
+    def get_duplicate_key(self):
+        return (
+            self['namespace'],
+            self['workspace'],
+        )
+
 
 class Buckets(AlertItems):
     @classmethod
@@ -81,6 +86,12 @@ class Buckets(AlertItems):
             { 'name': 'alert_time', 'type': 'TIMESTAMP' }
         ]
 
+    @classmethod
+    def get_alert_max_keys(cls):
+        return [
+            ('max_bucket_size_tb', 'size_tb'),
+        ]
+
     @classmethod
     def from_terra(cls, namespace, workspace=None):
         '''Get all buckets from Terra using FireCloud API.
@@ -110,27 +121,3 @@ class Buckets(AlertItems):
             ))
 
         return cls(items=items)
-
-    def send_alert(self, alert_sender, sep=',', quote_table='', dry_run=False):
-        if not self.items:
-            logger.info('send_alert: no buckets found to send alert.')
-            return
-
-        title = 'Terra billing alert ({type})'.format(
-            type=self.__class__.get_alert_item_type().__name__,
-        )
-        contents = (
-            'max_bucket_size_tb={max_bucket_size_tb}, '
-            'reported at {utc_time})'
-        ).format(
-            max_bucket_size_tb=max(self.items, key=lambda k: k['size_tb'])['size_tb'],
-            utc_time=get_utc_now(),
-        )
-        table = self.to_csv(sep=sep)
-        if quote_table:
-            table = quote_table + table + quote_table
-        message = '\n'.join([contents, table])
-
-        logger.info(f'send_alert: {title}, {message}')
-        if not dry_run:
-            alert_sender.send_message(title, message)
@@ -48,6 +48,16 @@ def main():
     Instance.LIMIT_MEMORY_GB = float(os.environ['INSTANCE_LIMIT_MEMORY_GB'])
     Bucket.LIMIT_SIZE_TB = float(os.environ['BUCKET_LIMIT_SIZE_TB'])
 
+    # Set max number of concurrent FireCloud API calls (optional)
+    terra_api_max_workers = os.environ.get('TERRA_API_MAX_WORKERS')
+    if terra_api_max_workers:
+        max_workers = int(terra_api_max_workers)
+        if max_workers < 1:
+            raise ValueError(
+                f'TERRA_API_MAX_WORKERS must be >= 1: {terra_api_max_workers}'
+            )
+        Workflows.MAX_WORKERS = max_workers
+
     # Set monitoring time window
     within_hours = float(os.environ['WITHIN_HOURS'])
 
@@ -60,27 +70,32 @@ def main():
 
     alert_sender = SlackSender(slack_channel, slack_token)
 
+    # Items are filtered by limits first
+    # so that BigQuery is not queried at all if there is nothing to alert
+
     # check workflows
-    workflows_from_terra = Workflows.from_terra(namespace, workspace)
-    workflows_from_bigquery = Workflows.from_bigquery(workflow_bigquery_table_id, within_hours)
-    workflows = workflows_from_terra.filter_out_duplicates(workflows_from_bigquery)
-    workflows = workflows.get_items_to_alert(within_hours)
+    workflows = Workflows.from_terra(namespace, workspace, within_hours).get_items_to_alert(within_hours)
+    if workflows.items:
+        workflows_from_bigquery = Workflows.from_bigquery(
+            workflow_bigquery_table_id, within_hours, time_key='submit_time'
+        )
+        workflows = workflows.filter_out_duplicates(workflows_from_bigquery)
     workflows.send_alert(alert_sender, sep='\t', quote_table='```', dry_run=slack_dry_run)
     workflows.update_bigquery(workflow_bigquery_table_id)
 
     # check instances
-    instances_from_terra = Instances.from_terra(namespace, workspace)
-    instances_from_bigquery = Instances.from_bigquery(instance_bigquery_table_id, within_hours)
-    instances = instances_from_terra.filter_out_duplicates(instances_from_bigquery)
-    instances = instances.get_items_to_alert(within_hours)
+    instances = Instances.from_terra(namespace, workspace).get_items_to_alert(within_hours)
+    if instances.items:
+        instances_from_bigquery = Instances.from_bigquery(instance_bigquery_table_id, within_hours)
+        instances = instances.filter_out_duplicates(instances_from_bigquery)
     instances.send_alert(alert_sender, sep='\t', quote_table='```', dry_run=slack_dry_run)
     instances.update_bigquery(instance_bigquery_table_id)
 
     # check buckets
-    buckets_from_terra = Buckets.from_terra(namespace, workspace)
-    buckets_from_bigquery = Buckets.from_bigquery(bucket_bigquery_table_id, within_hours)
-    buckets = buckets_from_terra.filter_out_duplicates(buckets_from_bigquery)
-    buckets = buckets.get_items_to_alert(within_hours)
+    buckets = Buckets.from_terra(namespace, workspace).get_items_to_alert(within_hours)
+    if buckets.items:
+        buckets_from_bigquery = Buckets.from_bigquery(bucket_bigquery_table_id, within_hours)
+        buckets = buckets.filter_out_duplicates(buckets_from_bigquery)
     buckets.send_alert(alert_sender, sep='\t', quote_table='```', dry_run=slack_dry_run)
     buckets.update_bigquery(bucket_bigquery_table_id)
 
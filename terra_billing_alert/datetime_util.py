@@ -1,4 +1,4 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 
 def get_utc_datetime_from_dict(d, key):
@@ -6,18 +6,30 @@ def get_utc_datetime_from_dict(d, key):
     For UTC-based timestamp only (e.g. timestamps in Cromwell's metadata JSON).
     '''
     if key in d:
-        return datetime.strptime(d[key], '%Y-%m-%dT%H:%M:%S.%fZ').replace(
+        val = d[key]
+        # fromisoformat is much faster than strptime. Use it only for UTC
+        # strings with suffix Z (otherwise it can return a naive datetime).
+        # Python < 3.11 does not accept suffix Z and takes 3 or 6 digits of
+        # fractional seconds only so fall back to strptime for other formats.
+        if val.endswith('Z'):
+            try:
+                return datetime.fromisoformat(val[:-1] + '+00:00')
+            except ValueError:
+                pass
+        return datetime.strptime(val, '%Y-%m-%dT%H:%M:%S.%fZ').replace(
             tzinfo=timezone.utc
         )
     return None
 
 
-def get_past_hours_from_now(time):
-    '''Get past hours from now = (now - `time`).
-    Args:
-        time: datetime object based on UTC timezone
+def get_utc_cutoff_time(within_hours):
+    '''Get UTC time `within_hours` before now.
+    Clamped to the earliest datetime if `within_hours` is too large (e.g. inf).
     '''
-    return (datetime.now(timezone.utc) - time).total_seconds()/3600
+    try:
+        return datetime.now(timezone.utc) - timedelta(hours=within_hours)
+    except OverflowError:
+        return datetime.min.replace(tzinfo=timezone.utc)
 
 
 def get_utc_now():
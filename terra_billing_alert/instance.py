@@ -2,9 +2,9 @@ import logging
 from .alert_item import (
     AlertItem,
     AlertItems,
+    get_float_for_duplicate_key,
 )
 from .datetime_util import (
-    get_past_hours_from_now,
     get_utc_datetime_from_dict,
     get_utc_now,
 )
@@ -61,11 +61,11 @@ class Instance(AlertItem):
             alert_time=d['alert_time']
         )
 
-    def need_to_alert(self, within_hours):
+    def need_to_alert(self, cutoff_time):
         too_many_cpu = self['cpu'] > Instance.LIMIT_CPU
         too_much_memory = self['memory_gb'] > Instance.LIMIT_MEMORY_GB
         is_running = self['status'] == 'Running'
-        time_is_within_hours = get_past_hours_from_now(self['alert_time']) < within_hours
+        time_is_within_hours = self['alert_time'] > cutoff_time
 
         if (too_many_cpu or too_much_memory) and is_running and \
            time_is_within_hours:
@@ -74,14 +74,17 @@ class Instance(AlertItem):
         return False
 
     def is_duplicate(self, item):
-        same_namespace = self['namespace'] == item['namespace']
-        same_workspace = self['workspace'] == item['workspace']
-        same_cpu = self['cpu'] == item['cpu']
-        same_memory = self['memory_gb'] == item['memory_gb']
-        same_status = self['status'] == item['status']
-
-        return same_namespace and same_workspace and same_cpu and \
-            same_memory and same_status
+        # all fields compared for duplicates are in key
+        return self.get_duplicate_key() == item.get_duplicate_key()
+
+    def get_duplicate_key(self):
+        return (
+            self['namespace'],
+            self['workspace'],
+            get_float_for_duplicate_key(self['cpu']),
+            get_float_for_duplicate_key(self['memory_gb']),
+            self['status'],
+        )
 
 
 class Instances(AlertItems):
@@ -102,6 +105,13 @@ class Instances(AlertItems):
             { 'name': 'alert_time', 'type': 'TIMESTAMP' }
         ]
 
+    @classmethod
+    def get_alert_max_keys(cls):
+        return [
+            ('max_cpu', 'cpu'),
+            ('max_memory_gb', 'memory_gb'),
+        ]
+
     @classmethod
     def from_terra(cls, namespace, workspace=None):
         '''Get all instances from Terra using FireCloud Workbench Notebook API.
@@ -150,28 +160,3 @@ class Instances(AlertItems):
                     ))
 
         return cls(items=items)
-
-    def send_alert(self, alert_sender, sep=',', quote_table='', dry_run=False):
-        if not self.items:
-            logger.info('send_alert: no instances found to send alert.')
-            return
-
-        title = 'Terra billing alert ({type})'.format(
-            type=self.__class__.get_alert_item_type().__name__,
-        )
-        contents = (
-            'max_cpu={max_cpu}, max_memory_gb={max_memory_gb}, '
-            'reported at {utc_time})'
-        ).format(
-            max_cpu=max(self.items, key=lambda k: k['cpu'])['cpu'],
-            max_memory_gb=max(self.items, key=lambda k: k['memory_gb'])['memory_gb'],
-            utc_time=get_utc_now(),
-        )
-        table = self.to_csv(sep=sep)
-        if quote_table:
-            table = quote_table + table + quote_table
-        message = '\n'.join([contents, table])
-
-        logger.info(f'send_alert: {title}, {message}')
-        if not dry_run:
-            alert_sender.send_message(title, message)
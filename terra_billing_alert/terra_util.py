@@ -1,13 +1,60 @@
 import firecloud.api as fapi
 import logging
+import threading
+import time
+from requests.adapters import HTTPAdapter
 
 
 logger = logging.getLogger(__name__)
 
+# pool_size of HTTP adapter mounted on FireCloud's session by init_http_pool()
+_HTTP_POOL_SIZE = None
+
+# Module-level caches are kept across invocations while
+# Cloud Function reuses the same Python process (warm start)
+WORKSPACES_CACHE_TTL_SEC = 3600
+_WORKSPACES_CACHE = {}
+
+# Metadata of a workflow in a terminal status does not change.
+# Oldest entries are evicted first if cache is full.
+WORKFLOW_TERMINAL_STATUSES = ('Succeeded', 'Failed', 'Aborted')
+WORKFLOW_METADATA_CACHE_MAX_SIZE = 10000
+_WORKFLOW_METADATA_CACHE = {}
+_WORKFLOW_METADATA_CACHE_LOCK = threading.Lock()
+
+
+def init_http_pool(pool_size):
+    '''Mount a larger HTTP connection pool on FireCloud's session.
+    The default pool keeps 10 connections only, so connections beyond that
+    are closed and reopened for concurrent API calls.
+    Mounted once per pool_size (session is kept across warm invocations).
+    '''
+    global _HTTP_POOL_SIZE
+
+    if _HTTP_POOL_SIZE == pool_size:
+        return
+
+    # initializes fapi's global session if it hasn't been set
+    fapi._fiss_agent_header()
+    old_adapter = fapi.__SESSION.adapters.get('https://')
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    fapi.__SESSION.mount('https://', adapter)
+    if old_adapter is not None:
+        old_adapter.close()
+
+    _HTTP_POOL_SIZE = pool_size
+
 
 def get_all_workspaces(namespace):
     '''Retuns a list of NAMEs of all workspaces.
+    Result is cached for WORKSPACES_CACHE_TTL_SEC.
     '''
+    cached = _WORKSPACES_CACHE.get(namespace)
+    if cached and cached[0] > time.monotonic():
+        result = list(cached[1])
+        logger.info(f'get_all_workspaces (cached): {result}')
+        return result
+
     result = []
     r = fapi.list_workspaces(fields='workspace.name,workspace.namespace')
 
@@ -16,6 +63,9 @@ def get_all_workspaces(namespace):
         for workspace_obj in workspace_objs:
             if workspace_obj['workspace']['namespace'] == namespace:
                 result.append(workspace_obj['workspace']['name'])
+        _WORKSPACES_CACHE[namespace] = (
+            time.monotonic() + WORKSPACES_CACHE_TTL_SEC, list(result)
+        )
     else:
         logger.error(f'Error retrieving workspaces from namespace {namespace} with error {r.text}')
 
@@ -53,11 +103,41 @@ def get_all_workflows(namespace, workspace, submission_id):
     return result
 
 
-def get_workflow_metadata(namespace, workspace, submission_id, workflow_id):
-    r = fapi.get_workflow_metadata(namespace, workspace, submission_id, workflow_id)
+def get_workflow_metadata(namespace, workspace, submission_id, workflow_id, include_key=None):
+    '''Returns workflow's metadata.
+    Metadata is cached if workflow is in a terminal status
+    (key `status` must be in `include_key` to be cached).
+    Up to WORKFLOW_METADATA_CACHE_MAX_SIZE entries are kept.
+    Args:
+        include_key:
+            A list of keys to be included in metadata.
+            Full metadata JSON can be huge so fetch required keys only.
+    '''
+    cache_key = (workflow_id, tuple(include_key) if include_key else None)
+    # single lookup since another thread can evict the entry at any time
+    cached = _WORKFLOW_METADATA_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    params = {'expandSubWorkflows': 'false'}
+    if include_key:
+        params['includeKey'] = include_key
+
+    # fapi.get_workflow_metadata() does not take query parameters
+    r = fapi.__get(
+        f'workspaces/{namespace}/{workspace}/submissions/{submission_id}/workflows/{workflow_id}',
+        params=params,
+    )
 
     if r.status_code == 200:
-        return r.json()
+        metadata = r.json()
+        if metadata.get('status') in WORKFLOW_TERMINAL_STATUSES:
+            with _WORKFLOW_METADATA_CACHE_LOCK:
+                # dict keeps insertion order so the first key is the oldest
+                while len(_WORKFLOW_METADATA_CACHE) >= WORKFLOW_METADATA_CACHE_MAX_SIZE:
+                    del _WORKFLOW_METADATA_CACHE[next(iter(_WORKFLOW_METADATA_CACHE))]
+                _WORKFLOW_METADATA_CACHE[cache_key] = metadata
+        return metadata
     else:
         logger.error(f'Error retrieving workflow id {workflow_id} with error {r.text}')
 
@@ -1,16 +1,18 @@
 '''Change Workflow.LIMIT_COST if you don't like the default value (200.0).
 '''
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from .alert_item import (
     AlertItem,
     AlertItems,
 )
 from .datetime_util import (
-    get_past_hours_from_now,
+    get_utc_cutoff_time,
     get_utc_datetime_from_dict,
     get_utc_now,
 )
 from .terra_util import (
+    init_http_pool,
     get_all_workspaces,
     get_all_submissions,
     get_all_workflows,
@@ -76,9 +78,9 @@ class Workflow(AlertItem):
             alert_time=d['alert_time']
         )
 
-    def need_to_alert(self, within_hours):
+    def need_to_alert(self, cutoff_time):
         cost_is_higher = self['cost'] >= Workflow.LIMIT_COST
-        time_is_within_hours = get_past_hours_from_now(self['submit_time']) < within_hours
+        time_is_within_hours = self['submit_time'] > cutoff_time
 
         if cost_is_higher and time_is_within_hours:
             return True
@@ -95,8 +97,24 @@ class Workflow(AlertItem):
         return same_namespace and same_workspace and \
             same_workflow_id and same_or_smaller_cost and same_status
 
+    def get_duplicate_key(self):
+        return (
+            self['namespace'],
+            self['workspace'],
+            self['workflow_id'],
+            self['status'],
+        )
+
 
 class Workflows(AlertItems):
+    '''Class variables:
+        MAX_WORKERS: Max number of concurrent FireCloud API calls
+        MAX_WORKERS_WORKSPACE: Max number of workspaces to list submissions
+            concurrently (capped at MAX_WORKERS)
+    '''
+    MAX_WORKERS = 32
+    MAX_WORKERS_WORKSPACE = 16
+
     @classmethod
     def get_alert_item_type(cls):
         return Workflow
@@ -119,11 +137,25 @@ class Workflows(AlertItems):
         ]
 
     @classmethod
-    def from_terra(cls, namespace, workspace=None):
+    def get_alert_item_table_partition_key(cls):
+        return 'submit_time'
+
+    @classmethod
+    def get_alert_max_keys(cls):
+        return [
+            ('max_cost', 'cost'),
+        ]
+
+    @classmethod
+    def from_terra(cls, namespace, workspace=None, within_hours=None):
         '''Get all workflows from Terra using FireCloud API.
         Args:
             workspace:
                 If not defined then look into all workspaces.
+            within_hours:
+                If defined then skip fetching metadata (start/end time) of
+                workflows submitted before this time window.
+                Such workflows are not alerted anyway.
         '''
         if workspace is None:
             workspaces = get_all_workspaces(namespace)
@@ -131,63 +163,76 @@ class Workflows(AlertItems):
             workspaces = [workspace]
 
         alert_time = get_utc_now()
+        cutoff_time = None if within_hours is None else get_utc_cutoff_time(within_hours)
         items = []
 
-        for workspace in workspaces:
-            for submission in get_all_submissions(namespace, workspace):
+        init_http_pool(cls.MAX_WORKERS)
+
+        # FireCloud API calls are I/O-bound so fan them out with thread pools
+        with ThreadPoolExecutor(max_workers=min(cls.MAX_WORKERS_WORKSPACE, cls.MAX_WORKERS)) as executor:
+            all_submissions = executor.map(
+                lambda workspace: get_all_submissions(namespace, workspace),
+                workspaces,
+            )
+            submissions = []
+            for workspace, submissions_in_workspace in zip(workspaces, all_submissions):
+                for submission in submissions_in_workspace:
+                    submissions.append((workspace, submission))
+
+        with ThreadPoolExecutor(max_workers=cls.MAX_WORKERS) as executor:
+            all_workflows = executor.map(
+                lambda t: get_all_workflows(namespace, t[0], t[1]['submissionId']),
+                submissions,
+            )
+            workflows = []
+            for (workspace, submission), workflows_in_submission in zip(submissions, all_workflows):
+                for workflow in workflows_in_submission:
+                    workflows.append((workspace, submission, workflow))
+
+            def get_metadata_if_costly(t):
+                workspace, submission, workflow = t
+                # metadata (start/end time) is only required for workflows
+                # that can be alerted. skip API calls for cheap or old workflows.
+                if (workflow.get('cost') or 0.0) < Workflow.LIMIT_COST:
+                    return {}
+                if cutoff_time is not None:
+                    submit_time = get_utc_datetime_from_dict(submission, 'submissionDate')
+                    # same comparison as in Workflow.need_to_alert()
+                    if submit_time is not None and submit_time <= cutoff_time:
+                        return {}
+                return get_workflow_metadata(
+                    namespace, workspace, submission['submissionId'], workflow['workflowId'],
+                    include_key=['start', 'end', 'status'],
+                )
+
+            all_wf_metadata = executor.map(get_metadata_if_costly, workflows)
+
+            for (workspace, submission, workflow), wf_metadata in zip(workflows, all_wf_metadata):
                 submission_id = submission['submissionId']
                 submitter = submission['submitter']
                 submission_name = submission['methodConfigurationName']
                 submit_time = get_utc_datetime_from_dict(
                     submission, 'submissionDate'
                 )
-
-                for workflow in get_all_workflows(
-                    namespace, workspace, submission_id,
-                ):
-                    cost = workflow.get('cost') or 0.0
-                    workflow_id = workflow['workflowId']
-                    status = workflow['status']
-                    wf_metadata = get_workflow_metadata(
-                        namespace, workspace, submission_id, workflow_id
-                    )
-                    start_time = get_utc_datetime_from_dict(wf_metadata, 'start')
-                    end_time = get_utc_datetime_from_dict(wf_metadata, 'end')
-
-                    items.append(Workflow(
-                        namespace=namespace,
-                        workspace=workspace,
-                        submission_id=submission_id,
-                        workflow_id=workflow_id,
-                        submission_name=submission_name,
-                        submitter=submitter,
-                        cost=cost,
-                        submit_time=submit_time,
-                        start_time=start_time,
-                        end_time=end_time,
-                        status=status,
-                        alert_time=alert_time,
-                    ))
+                cost = workflow.get('cost') or 0.0
+                workflow_id = workflow['workflowId']
+                status = workflow['status']
+                start_time = get_utc_datetime_from_dict(wf_metadata, 'start')
+                end_time = get_utc_datetime_from_dict(wf_metadata, 'end')
+
+                items.append(Workflow(
+                    namespace=namespace,
+                    workspace=workspace,
+                    submission_id=submission_id,
+                    workflow_id=workflow_id,
+                    submission_name=submission_name,
+                    submitter=submitter,
+                    cost=cost,
+                    submit_time=submit_time,
+                    start_time=start_time,
+                    end_time=end_time,
+                    status=status,
+                    alert_time=alert_time,
+                ))
 
         return cls(items=items)
-
-    def send_alert(self, alert_sender, sep=',', quote_table='', dry_run=False):
-        if not self.items:
-            logger.info('send_alert: no workflows found to send alert.')
-            return
-
-        title = 'Terra billing alert ({type})'.format(
-            type=self.__class__.get_alert_item_type().__name__,
-        )
-        contents = 'max_cost={max_cost}, reported at {utc_time})'.format(
-            max_cost=max(self.items, key=lambda k: k['cost'])['cost'],
-            utc_time=get_utc_now(),
-        )
-        table = self.to_csv(sep=sep)
-        if quote_table:
-            table = quote_table + table + quote_table
-        message = '\n'.join([contents, table])
-
-        logger.info(f'send_alert: {title}, {message}')
-        if not dry_run:
-            alert_sender.send_message(title, message)